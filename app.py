@@ -1,8 +1,16 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime, date
-import os
-from io import BytesIO
+from datetime import date
+
+from payments_core import (
+    ALL_OPTION, CHART_TOP_N, COLUMNS, EXCEL_FILE, TABLE_ROW_LIMIT, XLSX_MIME,
+    migrate_excel, records_mtime, load_data, save_record,
+    filter_options, compute_report, current_month_total,
+    excel_bytes_cached, monthly_totals, usd,
+)
+
+# ------------------ HTML Snippets ------------------
+_FILTER_BOX_OPEN = '<div style="padding:15px; background:white; border-radius:10px; border:1px solid #ddd;">'
+_FILTER_BOX_CLOSE = "</div>"
 
 # ------------------ Page Config ------------------
 st.set_page_config(
@@ -19,43 +27,10 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# ------------------ Constants ------------------
-EXCEL_FILE = "payments_records.xlsx"
-SHEET = "Records"
-COLUMNS = ["Timestamp", "Client", "Service", "Amount Paid (USD)"]
-
-# ------------------ Utility Functions ------------------
-@st.cache_data
-def load_data():
-    if os.path.exists(EXCEL_FILE):
-        df = pd.read_excel(EXCEL_FILE, sheet_name=SHEET, engine="openpyxl")
-        df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
-        df["Amount Paid (USD)"] = pd.to_numeric(df["Amount Paid (USD)"], errors="coerce")
-        return df
-    return pd.DataFrame(columns=COLUMNS)
-
-def save_record(client, service, amount):
-    new = pd.DataFrame([{
-        "Timestamp": datetime.now(),
-        "Client": client,
-        "Service": service,
-        "Amount Paid (USD)": float(amount),
-    }])
-    
-    if os.path.exists(EXCEL_FILE):
-        df = pd.read_excel(EXCEL_FILE, sheet_name=SHEET, engine="openpyxl")
-        df = pd.concat([df, new], ignore_index=True)
-    else:
-        df = new
-        
-    with pd.ExcelWriter(EXCEL_FILE, engine="openpyxl", mode="w") as writer:
-        df.to_excel(writer, sheet_name=SHEET, index=False)
-
-def usd(x):
-    return f"${x:,.2f}"
-
 # ------------------ Load Data ------------------
-df = load_data()
+migrate_excel()
+mtime = records_mtime()
+df = load_data(mtime)
 
 # ------------------ Layout ------------------
 left, right = st.columns([1, 2])
@@ -99,71 +74,92 @@ with right:
         st.info("No records yet. Add a payment to begin.")
         st.stop()
 
-    df["Date"] = pd.to_datetime(df["Timestamp"]).dt.date
-    df["YearMonth"] = pd.to_datetime(df["Timestamp"]).dt.to_period("M").astype(str)
-
     # Filters box
-    st.markdown("""
-    <div style="padding:15px; background:white; border-radius:10px; border:1px solid #ddd;">
-    """, unsafe_allow_html=True)
+    st.markdown(_FILTER_BOX_OPEN, unsafe_allow_html=True)
 
-    f1, f2, f3 = st.columns(3)
+    # Date bounds and selector options only change when the file does
+    min_date, max_date, client_choices, service_choices = filter_options(mtime)
 
-    min_date = df["Date"].min()
-    max_date = df["Date"].max()
+    # A form applies all three filters in one rerun instead of one per widget
+    with st.form("filters"):
+        f1, f2, f3 = st.columns(3)
 
-    with f1:
-        date_range = st.date_input("📅 Date range:", (min_date, max_date))
-    with f2:
-        client_filter = st.selectbox("👤 Filter by client:", ["All"] + df["Client"].unique().tolist())
-    with f3:
-        service_filter = st.selectbox("🛠 Filter by service:", ["All"] + df["Service"].unique().tolist())
+        with f1:
+            date_range = st.date_input("📅 Date range:", (min_date, max_date))
+        with f2:
+            client_filter = st.selectbox("👤 Filter by client:", client_choices)
+        with f3:
+            service_filter = st.selectbox("🛠 Filter by service:", service_choices)
 
-    st.markdown("</div>", unsafe_allow_html=True)
+        st.form_submit_button("🔍 Apply filters")
 
-    # Mask
-    mask = (df["Date"] >= date_range[0]) & (df["Date"] <= date_range[1])
-    if client_filter != "All":
-        mask &= df["Client"] == client_filter
-    if service_filter != "All":
-        mask &= df["Service"] == service_filter
+    st.markdown(_FILTER_BOX_CLOSE, unsafe_allow_html=True)
 
-    filtered = df[mask]
+    # Filtered view and its aggregates, memoized per data version and filter state
+    rows, total, count, avg, by_client, by_service = compute_report(
+        mtime, date_range[0], date_range[1],
+        None if client_filter == ALL_OPTION else client_filter,
+        None if service_filter == ALL_OPTION else service_filter,
+    )
 
     # KPI CARDS
     st.markdown("### 📌 Key Metrics")
 
     k1, k2, k3, k4 = st.columns(4)
 
-    k1.metric("Total (USD)", usd(filtered["Amount Paid (USD)"].sum()))
-    k2.metric("Records", len(filtered))
-    k3.metric("Average Ticket", usd(filtered["Amount Paid (USD)"].mean() if len(filtered) > 0 else 0))
+    k1.metric("Total (USD)", usd(total))
+    k2.metric("Records", count)
+    k3.metric("Average Ticket", usd(avg))
 
-    today = date.today()
-    current_ym = f"{today.year}-{today.month:02d}"
-    month_total = df[df["YearMonth"] == current_ym]["Amount Paid (USD)"].sum()
+    month_start = date.today().replace(day=1)
+    current_ym = month_start.strftime("%Y-%m")
+    month_total = current_month_total(mtime, month_start)
 
     k4.metric(f"This Month ({current_ym})", usd(month_total))
 
     # TABLE
     st.markdown("### 📄 Filtered Records")
-    st.dataframe(filtered, use_container_width=True)
+    # Newest first; only ship the latest TABLE_ROW_LIMIT rows unless asked for all
+    shown = rows[::-1]
+    if count > TABLE_ROW_LIMIT and not st.checkbox(f"Show all {count:,} records"):
+        shown = shown[:TABLE_ROW_LIMIT]
+        st.caption(f"Showing the most recent {TABLE_ROW_LIMIT:,} of {count:,} records.")
+    # Formatting happens in the browser, no per-row string conversion here
+    st.dataframe(df.take(shown)[COLUMNS], use_container_width=True, hide_index=True, column_config={
+        "Timestamp": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss"),
+        "Amount Paid (USD)": st.column_config.NumberColumn(format="$%.2f"),
+    })
+
+    # Workbooks are built only once asked for, then kept until the data or filters change
+    export_key = (mtime, date_range, client_filter, service_filter)
+    if st.session_state.get("excel_key") == export_key or st.button("⚙️ Prepare Excel files"):
+        st.session_state["excel_key"] = export_key
+        d1, d2 = st.columns(2)
+        full_bytes = excel_bytes_cached(mtime, None, df)
+        filtered_bytes = excel_bytes_cached(mtime, export_key[1:], df, rows)
+        d1.download_button("📥 Download full Excel", full_bytes,
+                           file_name=EXCEL_FILE, mime=XLSX_MIME)
+        d2.download_button("📥 Download filtered Excel", filtered_bytes,
+                           file_name="payments_filtered.xlsx", mime=XLSX_MIME)
 
     # CHARTS
     st.markdown("### 📈 Visual Charts")
 
-    chart1, chart2 = st.columns(2)
+    if count == 0:
+        st.info("No records match the selected filters.")
+    else:
+        chart1, chart2 = st.columns(2)
 
-    with chart1:
-        st.markdown("#### 🔹 Total by Client")
-        st.bar_chart(filtered.groupby("Client")["Amount Paid (USD)"].sum())
+        with chart1:
+            st.markdown(f"#### 🔹 Total by Client (top {CHART_TOP_N})")
+            st.bar_chart(by_client)
 
-    with chart2:
-        st.markdown("#### 🔹 Total by Service")
-        st.bar_chart(filtered.groupby("Service")["Amount Paid (USD)"].sum())
+        with chart2:
+            st.markdown(f"#### 🔹 Total by Service (top {CHART_TOP_N})")
+            st.bar_chart(by_service)
 
     # Monthly Summary
     st.markdown("#### 📆 Monthly Summary (USD)")
-    st.line_chart(df.groupby("YearMonth")["Amount Paid (USD)"].sum())
+    st.line_chart(monthly_totals(mtime))
 
 
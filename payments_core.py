@@ -0,0 +1,178 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import os
+
+# ------------------ Constants ------------------
+RECORDS_FILE = "payments_records.csv"
+EXCEL_FILE = "payments_records.xlsx"  # legacy store, imported once into RECORDS_FILE
+SHEET = "Records"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # fixed so every CSV row parses the same way
+COLUMNS = ["Timestamp", "Client", "Service", "Amount Paid (USD)"]
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHART_TOP_N = 20  # bars per chart; nlargest keeps this a partial sort
+ALL_OPTION = "All"  # selector entry meaning "no filter"
+TABLE_ROW_LIMIT = 1000  # rows sent to the records table unless "show all" is ticked
+
+# ------------------ Utility Functions ------------------
+def migrate_excel():
+    # Records used to live in an xlsx that was rewritten on every save
+    if not os.path.exists(RECORDS_FILE) and os.path.exists(EXCEL_FILE):
+        try:
+            df = pd.read_excel(EXCEL_FILE, sheet_name=SHEET, engine="calamine")
+        except (ImportError, ValueError):  # python-calamine missing or pandas < 2.2
+            df = pd.read_excel(EXCEL_FILE, sheet_name=SHEET, engine="openpyxl")
+        df.reindex(columns=COLUMNS).to_csv(RECORDS_FILE, index=False, date_format=TIMESTAMP_FORMAT)
+
+@st.cache_resource(max_entries=1)
+def _load_cached(path, mtime):
+    # mtime is only part of the cache key: a save changes it and forces a re-read
+    # Shared by every caller without a copy per hit, so nothing may modify it
+    # Arrow strings instead of Python objects; also backs the categories below
+    df = pd.read_csv(path, dtype={"Client": "string[pyarrow]", "Service": "string[pyarrow]"})
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"], format="ISO8601", errors="coerce")
+    # Appended records are already in time order, so this stable sort is a linear
+    # pass that guarantees it; NaT rows go last
+    df = df.sort_values("Timestamp", kind="stable")  # index keeps the file row order
+    df["Amount Paid (USD)"] = pd.to_numeric(df["Amount Paid (USD)"], errors="coerce")
+    # Categories keep the sorted distinct values and let groupby work on int codes
+    df["Client"] = df["Client"].astype("category")
+    df["Service"] = df["Service"].astype("category")
+    return df
+
+def records_mtime():
+    return os.path.getmtime(RECORDS_FILE) if os.path.exists(RECORDS_FILE) else None
+
+def load_data(mtime):
+    # The caller's mtime, so compute_report row positions index this same frame
+    if mtime is not None:
+        return _load_cached(RECORDS_FILE, mtime)
+    return pd.DataFrame(columns=COLUMNS)
+
+def save_record(client, service, amount):
+    new = pd.DataFrame([{
+        "Timestamp": datetime.now(),
+        "Client": client,
+        "Service": service,
+        "Amount Paid (USD)": float(amount),
+    }])
+
+    # Appending keeps each save O(1) regardless of how many records exist
+    new.to_csv(RECORDS_FILE, mode="a", header=not os.path.exists(RECORDS_FILE), index=False,
+               date_format=TIMESTAMP_FORMAT)
+
+def to_excel_bytes(df):
+    # Imported here: only needed when a download is built, not on every cold start
+    from io import BytesIO
+    import openpyxl
+
+    # Write-only workbooks stream rows instead of building a cell DOM
+    df = df.astype(object).where(df.notna(), None)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET)
+    ws.append(df.columns.tolist())
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=8)
+def excel_bytes_cached(mtime, filters, _df, _rows=None):
+    # _df/_rows are not hashed: the file mtime plus the filter values identify them
+    # Exports keep the file row order, not the loader's time order
+    df = _df if _rows is None else _df.take(_rows)
+    return to_excel_bytes(df.sort_index()[COLUMNS])
+
+@st.cache_data(max_entries=1)
+def filter_options(mtime):
+    df = _load_cached(RECORDS_FILE, mtime)
+    ts = df["Timestamp"]
+    # Rows are sorted with NaT last, so the date bounds are the ends of the valid run
+    first, last = ts.iat[0], ts.iat[max(ts.count(), 1) - 1]
+    # Selector options include the ALL_OPTION entry so reruns don't rebuild the lists
+    return (first.date(), last.date(),
+            [ALL_OPTION] + df["Client"].cat.categories.tolist(),
+            [ALL_OPTION] + df["Service"].cat.categories.tolist())
+
+def _category_mask(col, value):
+    # Compare the small integer codes against one code instead of comparing strings
+    code = col.cat.categories.get_indexer([value])[0]
+    if code < 0:
+        return np.zeros(len(col), dtype=bool)
+    return col.cat.codes.to_numpy() == code
+
+def _sum_by_category(col, rows, amounts):
+    codes = col.cat.codes.to_numpy()[rows]
+    known = codes >= 0  # -1 marks a missing value
+    codes, amounts = codes[known], amounts[known]
+    size = len(col.cat.categories)
+    present = np.bincount(codes, minlength=size) > 0
+    sums = np.bincount(codes, weights=np.nan_to_num(amounts), minlength=size)
+    return pd.Series(sums[present], index=col.cat.categories[present].rename(col.name),
+                     name="Amount Paid (USD)")
+
+@st.cache_data(max_entries=16)
+def compute_report(mtime, start, end, client, service):
+    # Everything the filtered view needs, so reruns with unchanged filters skip it.
+    # Matches are row positions into the cached frame, not a copied frame
+    df = _load_cached(RECORDS_FILE, mtime)
+    # Rows are time-sorted (NaT last), so the date range is a binary-searched slice;
+    # the end bound is exclusive at the next midnight
+    ts = df["Timestamp"].to_numpy()
+    lo = ts.searchsorted(np.datetime64(start))
+    hi = ts.searchsorted(np.datetime64(end) + np.timedelta64(1, "D"))
+    rows = np.arange(lo, hi)
+
+    # Category filters only scan the rows inside the date window
+    if client is not None or service is not None:
+        mask = np.ones(rows.size, dtype=bool)
+        if client is not None:
+            mask &= _category_mask(df["Client"].iloc[lo:hi], client)
+        if service is not None:
+            mask &= _category_mask(df["Service"].iloc[lo:hi], service)
+        rows = rows[mask]
+
+    # A single reduction over the amounts; count and average follow from it
+    amounts = df["Amount Paid (USD)"].to_numpy()[rows]
+    count = amounts.size
+    total = np.nansum(amounts)
+    if count == 0:
+        empty = pd.Series(dtype=float, name="Amount Paid (USD)")
+        return rows, total, count, 0, empty, empty
+    # Blank amounts count as records but not towards the average
+    valid = count - np.count_nonzero(np.isnan(amounts))
+
+    by_client = _sum_by_category(df["Client"], rows, amounts).nlargest(CHART_TOP_N)
+    by_service = _sum_by_category(df["Service"], rows, amounts).nlargest(CHART_TOP_N)
+    return rows, total, count, total / valid if valid else 0, by_client, by_service
+
+@st.cache_data(max_entries=1)
+def current_month_total(mtime, month_start):
+    # datetime64 bounds instead of string keys; keyed on month_start so it rolls over
+    df = _load_cached(RECORDS_FILE, mtime)
+    start = pd.Timestamp(month_start)
+    ts = df["Timestamp"]
+    return df.loc[(ts >= start) & (ts < start + pd.offsets.MonthBegin()), "Amount Paid (USD)"].sum()
+
+@st.cache_data(max_entries=1)
+def monthly_totals(mtime):
+    # Sum per month with np.bincount over integer year*12+month keys instead of
+    # a hash groupby on "YYYY-MM" strings; ignores the filters, so keyed on mtime only
+    df = _load_cached(RECORDS_FILE, mtime)
+    ts = df["Timestamp"].dropna()
+    if ts.empty:
+        return pd.Series(dtype=float, name="Amount Paid (USD)")
+    keys = (ts.dt.year.to_numpy() * 12 + ts.dt.month.to_numpy() - 1).astype(np.int64)
+    amounts = df.loc[ts.index, "Amount Paid (USD)"].fillna(0).to_numpy()
+    first = keys.min()
+    keys -= first
+    totals = np.bincount(keys, weights=amounts)
+    months = np.flatnonzero(np.bincount(keys)) + first
+    labels = pd.Index([f"{m // 12}-{m % 12 + 1:02d}" for m in months], name="YearMonth")
+    return pd.Series(totals[months - first], index=labels, name="Amount Paid (USD)")
+
+def usd(x):
+    # x != x is only true for NaN, so no try/except is needed for missing values
+    return "-" if x is None or x != x else f"${x:,.2f}"